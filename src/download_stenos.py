@@ -26,13 +26,35 @@ Permissions of this strong copyleft license are conditioned on making available
 
 import os, sys
 import re
+import csv
+import gzip
+import zlib
+import json
 import logging
+import logging.handlers
+import threading
 from bs4 import BeautifulSoup
 import requests
 import argparse
 
 from pathlib import Path
-from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+from collections import namedtuple, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from lxml import etree
+import lxml.html
+
+# orjson is faster, use the standard library json if it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# lxml is much faster than the pure python parsers
+HTML_PARSER = 'lxml'
 
 class SessionManager:
     __slots__ = ['valid', 'title', 'index', 'date', 'base_session_url']
@@ -50,32 +72,214 @@ class SessionManager:
         str_ += "URL: {}".format(self.base_session_url)
         return str_
 
+# election years with steno-protocols in psp.cz
+VALID_YEARS = frozenset({"1993", "1996", "1998", "2002", "2006", "2010", "2013", "2017"})
+
+# HTTP client settings
+USER_AGENT = 'pspcz-steno-downloader (+https://github.com/mbercas/pspcz)'
+REQUEST_TIMEOUT = 30    # seconds
+FETCH_WORKERS = 8       # concurrent downloads per session
+SESSION_WORKERS = 4     # sessions processed concurrently
+
+# Cached pages are gzip compressed, parsed steno pages are stored as json
+CACHE_SUFFIX = '.gz'
+PARSED_SUFFIX = '.parsed.json'
+PARSED_VERSION = 1      # increase when the output of parse_steno changes
+
+# Reports are TAB separated files with no quoting and no escaping, the
+# fields are cleaned with tsv_row so they can not break the layout
+REPORT_BUFFER_SIZE = 1 << 20
+csv.register_dialect('psp-tsv', delimiter='\t', quoting=csv.QUOTE_NONE,
+                     quotechar=None, lineterminator='\n')
+_TSV_FIELD_TABLE = str.maketrans('\t\r\n', '   ')
+FILE_SUMMARY_HEADER = ("session", "date", "topic_idx", "topic_str", "order",
+                       "name", "steno_name", "file_name")
+SPEAKERS_SUMMARY_HEADER = ("name", "titles", "function", "steno_name", "sex",
+                           "party", "birthdate", "web_page")
+
+
+def create_http_session():
+    """Creates a requests session that keeps the connections alive and
+    retries the requests that fail with transient server errors"""
+    http = requests.Session()
+    http.headers['User-Agent'] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64,
+                          max_retries=Retry(total=5, backoff_factor=0.3,
+                                            status_forcelist=(500, 502, 503, 504),
+                                            allowed_methods=frozenset(['GET'])))
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    return http
+
+# Shared by all the requests of the program
+HTTP = create_http_session()
+
 CzechMonths = {'ledna':1, 'února':2, 'března':3,'dubna':4,'května':5,
                'června':6,'července':7,'srpna':8, 'září':9,
                'října':10, 'listopadu':11, 'prosince':12 }
 
+# Regular expressions used by the parsers, compiled once at import time
+_RE_INDEX_POST2010 = re.compile(rb'href="([^"]+schuz[^"]*\.html?)"', re.I)
+_RE_INDEX_PRE2010 = re.compile(rb'href="([^"]+schuz/)"', re.I)
+_RE_TOPIC_QID = re.compile(r'^.*html#(q[\d]+)$')
+_RE_TOPIC_HASH_2013 = re.compile(r'^.*html(#[a-z][\d]+)$')
+_RE_TOPIC_HASH_PRE2013 = re.compile(r'^.*html#([\d]+)$')
+_RE_PAGE_POST2010 = re.compile(r'^(.*.html).*')
+_RE_PAGE_PRE2010 = re.compile(r'^.*schuz/(.*.html).*')
+_RE_INTERVENTION_LINK = re.compile(r'(s[\d]*.htm)#(r[\d]*)$')
+_RE_TITLE_DATE = re.compile(r'Stenografický zápis [\d]+. schůze, ([\d]+).\s(.*)\s(\d{4})')
+_RE_SPEAKER_DETAIL = re.compile(r'/sqw/detail.sqw\?id=(\d+)$')
+_RE_FIG_ZVOLEN = re.compile(r'Narozen.?: ([\d]+)\..(\d+)\..(\d+).*Zvolen.? na kandidátce: (.*)$')
+_RE_FIG_NAROZEN = re.compile(r'Narozen: ([\d]+)\..(\d+)\..(\d+)$', re.DOTALL)
+_RE_WS = re.compile(r' {2,}')
+_RE_KEYCHARS = re.compile(r'[ ,]+')
+
+# Topic anchors and intervention links of a page in document order
+_XPATH_PAGE_LINKS = etree.XPath('//a[@name or @href]')
+
+# Name and figure caption in the speaker pages
+_XPATH_H1_TEXT = etree.XPath('string(//h1)')
+_XPATH_FIGCAPTION = etree.XPath('//div[contains(concat(" ", normalize-space(@class), " "), " figcaption ")]')
+
+# Maps every white space character (including '\xa0') to a plain space
+_WS_TABLE = str.maketrans({c: ' ' for c in map(chr, range(0x3001))
+                           if c.isspace() and c != ' '})
+
+# Titles are removed from the speaker names in this order
+TITLE_STRINGS = ("doc.", "Prof.", "RSDR.", "RSDr.", "RNDr.","Ing.", "JUDr.", "PhDr.", "Mgr.", "MBA", "ThMgr.", "CSc.",
+                 "PaedDr.", "Ph.D.", "MUDr.", "Bc.", "arch.", "Doc.", "MVDr.", "Th"
+                 "prof.", "MVDR.", "MgA.", "PhD.JU", "ThDr.", "PhD.", "DrSc.", "Dr.")
+
+# The function of the speaker in the steno name tells the sex
+MALE_STRINGS = ("Poslanec", "Ministr", "Místopředseda", "Předseda", "Senátor","poslanec", "ministr", "místopředseda", "předseda", "senátor")
+FEMALE_STRINGS = ("Poslankyně",  "Ministryně", "Členka", "Senátorka", "Místopředsedkyně", "poslankyně",  "ministryně", "členka", "senátorka", "místopředsedkyně")
+_RE_MALE_FUNCTION = re.compile('|'.join(map(re.escape, MALE_STRINGS)))
+_RE_FEMALE_FUNCTION = re.compile('|'.join(map(re.escape, FEMALE_STRINGS)))
+
+
 
 def get_all_stenos(res, year):
-    """Gets the content page of PSP and returns all the links to the prococols"""
-    soup_main = BeautifulSoup(res, 'html5lib')
+    """Gets the content page of PSP and returns all the links to the prococols
+
+    The index is a flat list of links, they are extracted with a regex
+    from the raw bytes of the page without decoding it or building the
+    document tree
+
+    :param res: `bytes` raw content of the index page
+    :rtype: `list[str]` with the links"""
     if year >= 2010:
-        reg_ex_steno_main = re.compile(r'^.*schuz.*htm[l]?$')
+        reg_ex_steno_main = _RE_INDEX_POST2010
     else:
-        reg_ex_steno_main = re.compile(r'^.*schuz/$')
-    return [l.get('href') for l in soup_main.find_all('a') if None != reg_ex_steno_main.search(l.get('href'))]
+        reg_ex_steno_main = _RE_INDEX_PRE2010
+    return [link.decode('utf-8', 'replace') for link in reg_ex_steno_main.findall(res)]
 
 
-def check_request(res):
-    """Returns False if the request failed"""
-    rc = True
-    if res.status_code == requests.codes.ok:
-        logging.info("Connected to page %s", steno_page_url)
-        if steno_page_url == "http://psp.cz/eknih/2010ps/stenprot/index.htm":
-            print("found")
+def steno_paragraphs(steno):
+    """Walks the main content of a steno page once and returns a list of
+    (paragraph, first link in the paragraph) pairs in document order.
+
+    Headers are skipped, they are centered paragraphs or paragraphs placed
+    in a div or center block inside the main content"""
+    paragraphs = []
+    current = None
+    nested = 0
+    for event, element in etree.iterwalk(steno, events=('start', 'end')):
+        if element is steno:
+            continue
+        tag = element.tag
+        if tag == 'div' or tag == 'center':
+            nested += 1 if event == 'start' else -1
+        elif nested:
+            continue
+        elif tag == 'p':
+            current = None
+            if event == 'start' and element.get('align') != 'center':
+                current = [element, None]
+                paragraphs.append(current)
+        elif tag == 'a' and event == 'start' and current is not None and current[1] is None:
+            current[1] = element
+    return paragraphs
+
+
+def dump_json(obj):
+    """Serializes obj to utf-8 encoded json bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def load_json(data):
+    """Deserializes json bytes, raises ValueError if they are not valid"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def write_text_file(file_name, text):
+    """Writes the text to a file encoded as utf-8 without going through a
+    buffered file object, the permissions follow the umask like open()"""
+    data = memoryview(text.encode('utf-8'))
+    fd = os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        # os.write can write less than requested, write the rest
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+def write_cache_file(file_name, data):
+    """Writes the bytes to a cache file, the data goes to a temporary file
+    first so an interrupted write never leaves a truncated cache entry
+
+    :param file_name: `Path` of the cache file
+    :param data: `bytes` contents of the file
+    """
+    file_name.parents[0].mkdir(parents=True, exist_ok=True)
+    tmp_file_name = file_name.with_name(f"{file_name.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp_file_name.write_bytes(data)
+        os.replace(tmp_file_name, file_name)
+    except BaseException:
+        tmp_file_name.unlink(missing_ok=True)
+        raise
+
+
+def tsv_row(row):
+    """Returns the row with the TABs and line breaks in the text fields
+    replaced by spaces, any other character is written as it is"""
+    return tuple(field.translate(_TSV_FIELD_TABLE) if isinstance(field, str) else field
+                 for field in row)
+
+
+@contextmanager
+def open_report(output_directory, file_name, header, create_new_report):
+    """Opens a TSV report and yields a csv writer for it, the header is only
+    written for new reports, otherwise rows are appended.
+
+    :param output_directory: `str` directory for the report
+    :param file_name: `str` name of the report file
+    :param header: `tuple` column names of the report
+    :param create_new_report: `bool` overwrite the report if it already exists
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    csv_file = os.path.join(output_directory, file_name)
+
+    if not os.path.exists(csv_file):
+        create_new_report = True
+
+    if create_new_report:
+        open_str = 'w'
     else:
-        logging.error("Unable to open page: %s", steno_page_url)
-        rc = False
-    return rc
+        open_str = 'a'
+
+    with open(csv_file, open_str, newline='', encoding='utf-8',
+              buffering=REPORT_BUFFER_SIZE) as fd:
+        writer = csv.writer(fd, dialect='psp-tsv')
+        if create_new_report:
+            writer.writerow(header)
+        yield writer
 
 
 # Define some data types for collections of the data
@@ -92,9 +296,13 @@ class SessionParser:
             self.link = ""
             self.date_string = ""
             self.content = ""
-            self.soup = None
+            self.tree = None
 
-    def __init__(self, year, base_url, session_number, session_link):
+    # paths of all the files in the cache, shared by all the parsers
+    _cache_index = None
+    _cache_index_lock = threading.Lock()
+
+    def __init__(self, year, base_url, session_number, session_link, http=None):
 
         self.year = year
         self.base_url = base_url
@@ -110,11 +318,41 @@ class SessionParser:
         self.speakers = {}
         self.request_counter = 0
         self.visited_links = {}
+        self._key_cache = {}     # speaker link text -> (steno name, speaker key)
+
+        # the layout of the links depends on the year, select the regexes once
+        if year == 2013:
+            self._topic_hash_re = _RE_TOPIC_HASH_2013
+        else:
+            self._topic_hash_re = _RE_TOPIC_HASH_PRE2013
+        if year >= 2010:
+            self._page_re = _RE_PAGE_POST2010
+        else:
+            self._page_re = _RE_PAGE_PRE2010
 
         self.cache = Path('.') / '.cache'
         if not self.cache.exists():
             self.cache.mkdir(parents=True)
 
+        # scan the cache once instead of checking every link with stat()
+        with SessionParser._cache_index_lock:
+            if SessionParser._cache_index is None:
+                SessionParser._cache_index = {os.path.join(root, name)
+                                              for root, _, files in os.walk(self.cache)
+                                              for name in files}
+
+        # keep-alive connections to psp.cz are reused across requests
+        self.http = http if http is not None else HTTP
+
+
+    def release_pages(self):
+        """Drops the parsed HTML of the session and topic pages, only the
+        stenos, topics and speakers are needed to generate the files"""
+        self.session_soup = None
+        for page in self.pages.values():
+            page.content = ""
+            page.tree = None
+
 
     def request(self, link):
         """Manages the request to the link and collect statistis
@@ -123,29 +361,83 @@ class SessionParser:
         from cache.
 
         :param link str: link to the page to request
-        :rtype str: the contents of the web page in a string"""
+        :rtype bytes: the raw contents of the web page"""
 
-        file_str = link.replace('http://public.psp.cz/eknih/', '')
+        text = self._cache_read(link)
+        if text is None:
+            self.request_counter += 1
+            text = self._fetch(link)
+        return text
 
-        cached_file_name = self.cache / file_str
-        text = ""
+    def prefetch(self, links):
+        """Downloads in parallel all the links that are not in the cache yet,
+        so the following calls to request are served from the cache
 
+        :param links list: links to the pages to download"""
 
-        if cached_file_name.exists():
-            logging.debug(f"{cached_file_name} ...reusing")
-            text = cached_file_name.read_text(encoding='utf-8')
-        else:
-            res = requests.get(link)
+        pending = [link for link in dict.fromkeys(links)
+                   if not self._is_cached(self._cache_file(link))]
+        if len(pending) == 0:
+            return
 
-            self.request_counter += 1
-            if False == check_request(res):
-                raise Exception()
+        logging.info("Prefetching %d pages", len(pending))
+        self.request_counter += len(pending)
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            for link, ok in zip(pending, executor.map(self._try_fetch, pending)):
+                if not ok:
+                    logging.warning("Prefetch failed for %s", link)
+
+    def _cache_file(self, link, suffix=CACHE_SUFFIX):
+        """Returns the path of the cached copy of the link, pages are
+        stored gzip compressed"""
+        file_str = link.replace('http://public.psp.cz/eknih/', '')
+        return self.cache / (file_str + suffix)
+
+    def _is_cached(self, cached_file_name):
+        """Returns True if the file is in the cache"""
+        return str(cached_file_name) in self._cache_index
+
+    def _cache_read(self, link):
+        """Returns the cached raw contents of the link or None if not cached"""
+        cached_file_name = self._cache_file(link)
+        if not self._is_cached(cached_file_name):
+            return None
+
+        logging.debug("%s ...reusing", cached_file_name)
+        try:
+            text = gzip.decompress(cached_file_name.read_bytes())
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            text = b''
 
-            cached_file_name.parents[0].mkdir(parents=True, exist_ok=True)
-            cached_file_name.write_text(res.text, encoding='utf-8')
-            text = res.text
+        # a damaged or empty copy is downloaded again and overwritten
+        if len(text) == 0:
+            logging.warning("Ignoring damaged cache file %s", cached_file_name)
+            return None
         return text
 
+    def _fetch(self, link):
+        """Downloads the link and stores it in the cache, raises an exception
+        if the page can not be retrieved"""
+        res = self.http.get(link, timeout=REQUEST_TIMEOUT)
+
+        if not res.ok:
+            logging.error("Unable to open page: %s", link)
+            raise Exception()
+        logging.info("Connected to page %s", link)
+
+        cached_file_name = self._cache_file(link)
+        write_cache_file(cached_file_name, gzip.compress(res.content, compresslevel=6))
+        self._cache_index.add(str(cached_file_name))
+        return res.content
+
+    def _try_fetch(self, link):
+        """Wraps _fetch for the thread pool, returns False on failure"""
+        try:
+            self._fetch(link)
+        except Exception:
+            return False
+        return True
+
 
     def parse_session_post_2013(self):
 
@@ -192,7 +484,7 @@ class SessionParser:
         all links go below topic are of the form < a href=
         """
         links = self.session_soup.find_all('a')
-        reg_ex_topic = re.compile('^.*html#(q[\d]+)$')
+        reg_ex_topic = _RE_TOPIC_QID
 
         topic_id = 0
         for link in links:
@@ -203,7 +495,7 @@ class SessionParser:
                 if topic_id not in self.topics:
                     self.topics[topic_id] = []
                     self.topic_titles[topic_id] = self.filter_text(link.next_sibling.text)
-                    logging.debug(f"{self.topic_titles[topic_id]=} - {topic_id}")
+                    logging.debug("self.topic_titles[topic_id]=%r - %s", self.topic_titles[topic_id], topic_id)
                     continue
 
             except KeyError:
@@ -234,7 +526,7 @@ class SessionParser:
         all links go below topic are of the form < a href=
         """
         links = self.session_soup.find_all('a')
-        reg_ex_topic = re.compile('^.*html#([\d]+)$')
+        reg_ex_topic = _RE_TOPIC_HASH_PRE2013
 
         topic_id = 0
         for link in links:
@@ -245,7 +537,7 @@ class SessionParser:
                 if topic_id not in self.topics:
                     self.topics[topic_id] = []
                     self.topic_titles[topic_id] = self.filter_text(link.next_sibling.text)
-                    logging.debug(f"{self.topic_titles[topic_id]=} - {topic_id}")
+                    logging.debug("self.topic_titles[topic_id]=%r - %s", self.topic_titles[topic_id], topic_id)
                     continue
 
             except KeyError:
@@ -290,7 +582,7 @@ class SessionParser:
         except Exception:
             return False
 
-        main_soup =  BeautifulSoup(text, 'html5lib')
+        main_soup =  BeautifulSoup(text, HTML_PARSER)
         self.session_soup = main_soup
 
         if self.year == 2013:
@@ -308,115 +600,161 @@ class SessionParser:
     def get_all_stenos(self):
         """Iterate the interventions dictionary to download all the pages of
         the stenos, parse them and strore them in the stenos dictionary"""
-        for topic in self.topics.values():
-            if len(topic) == 0:
+
+        # many interventions share a steno page, collect each page once
+        stenopages = dict.fromkeys(int_info.stenopage
+                                   for topic in self.topics.values()
+                                   for int_info in topic
+                                   if int_info.stenopage not in self.stenos)
+        links = [self.sublinks + stenopage for stenopage in stenopages]
+
+        # download the missing pages in parallel, parsing below reads the cache
+        self.prefetch([link for link in links
+                       if not self._is_cached(self._cache_file(link, PARSED_SUFFIX))])
+
+        for stenopage, link in zip(stenopages, links):
+            try:
+                interventions = self.load_steno(link)
+            except Exception:
+                logging.error("Can not open steno page %s", link)
                 continue
 
-            for int_info in topic:
-                if int_info.stenopage not in self.stenos:
-                    link = self.sublinks + int_info.stenopage
+            if interventions is not None:
+                self.stenos[stenopage] = interventions
 
-                    try:
-                        text = self.request(link)
-                    except Exception:
-                        logging.error("Can not open steno page %s", link)
-                        continue
+    def load_steno(self, link):
+        """Returns the interventions dictionary of a steno page
 
-                    # All paragraphs with text are justified
-                    text = text #.lower()
-                    soup =  BeautifulSoup(text, 'html5lib')
-                    self.stenos[int_info.stenopage] = self.parse_steno(soup)
+        The result of parse_steno is stored next to the cached page, following
+        runs load it and skip the HTML parsing. Returns None if the page has
+        no main content and raises an exception if it can not be retrieved."""
+
+        parsed_file_name = self._cache_file(link, PARSED_SUFFIX)
+        if self._is_cached(parsed_file_name):
+            try:
+                return self._load_parsed_steno(parsed_file_name)
+            except (ValueError, KeyError, TypeError):
+                logging.warning("Ignoring invalid parsed steno %s", parsed_file_name)
+
+        text = self.request(link)
+
+        # All paragraphs with text are justified
+        main_content = lxml.html.fromstring(text).xpath('//div[@id="main-content"]')
+        if len(main_content) == 0:
+            logging.error("Can not find main content in steno page %s", link)
+            return None
+
+        interventions = self.parse_steno(main_content[0])
+        self._store_parsed_steno(parsed_file_name, interventions)
+        return interventions
+
+    def _store_parsed_steno(self, parsed_file_name, interventions):
+        """Writes the interventions and the speakers found in them as json"""
+        # keep the order of first appearance, like parse_steno adds them
+        speaker_keys = dict.fromkeys(i.speaker_key for i in interventions.values())
+        parsed = {'version': PARSED_VERSION,
+                  'interventions': {r_id: list(i) for r_id, i in interventions.items()},
+                  'speakers': {key: [self.speakers[key].stenoname, self.speakers[key].link]
+                               for key in speaker_keys if key in self.speakers}}
+        write_cache_file(parsed_file_name, dump_json(parsed))
+        self._cache_index.add(str(parsed_file_name))
+
+    def _load_parsed_steno(self, parsed_file_name):
+        """Reads the interventions stored by _store_parsed_steno and adds the
+        speakers to the speakers dictionary, like parse_steno does"""
+        parsed = load_json(parsed_file_name.read_bytes())
+        if parsed['version'] != PARSED_VERSION:
+            raise ValueError("Outdated parsed steno")
+
+        for key, (stenoname, link) in parsed['speakers'].items():
+            key = sys.intern(key)
+            if key not in self.speakers:
+                logging.info("New speaker found: %s", stenoname)
+                self.speakers[key] = Speaker(stenoname, "", "", "", "", "", "", "", link)
+
+        return {sys.intern(r_id): Intervention(stenoname, text, sys.intern(speaker_key))
+                for r_id, (stenoname, text, speaker_key) in parsed['interventions'].items()}
 
     def parse_steno(self, steno):
         """Parse the steno text and generate a interventions dictionary
         The interventions is a dictionary containing the topic id (r<nn>)
         as a key and tupple with the speker and text for the intervention.
+
+        :param steno: `lxml.html.HtmlElement` the main-content div of the page
         """
         r_id = ""
         text = ""
         speaker = ""
         interventions = {}
 
-        # remove the parts of the page that do not contain information
-        #soup.head.decompose()
-        #soup.find('div', id='header').decompose()
-        #soup.find('div', id='menu').decompose()
-        #soup.find('div', id='tools').decompose()
-        #soup.find('div', id='footer').decompose()
-
-        #[s.decompose() for s in soup.find_all('script')]
-
-
-        steno = steno.find("div", id='main-content')
-        [div.decompose() for div in steno.find_all("div")]
-
-        #remove all centered paragraphs - they contain headers
-        [p.decompose() for p in steno.find_all('p', attrs={'align':'center'})]
-        [p.decompose() for p in steno.find_all('center')]
-
+        # centered paragraphs and nested blocks contain headers and are skipped
         # aligned paragraphs do only exist after 1996
-        #text_paragraphs = steno.find_all('p', attrs={'align':'justify'})
-        text_paragraphs = steno.find_all('p')
-
-        # print(f">> {len(text_paragraphs)=}")
+        text_paragraphs = steno_paragraphs(steno)
 
         speaker_key = ""
-        for p in text_paragraphs:
+        for p, speaker_link in text_paragraphs:
+            p_text = p.text_content()
             # ignore empty
-            if p.text == '\xa0' or p.text == '':
+            if p_text == '\xa0' or p_text == '':
                 continue
-            
-            speaker_link = p.find('a')
-
-            # print(f" >> >> >> {speaker_link=}")
-            #if speaker_link and speaker_link.has_attr('id') and speaker_link.has_attr('href') and 'hlasy.sqw' not in speaker_link['href']:
-            if speaker_link and speaker_link.has_attr('id'):
-                if speaker_link.has_attr('href'):
-                    if 'hlasy.sqw' in speaker_link['href']: #or "historie.sqw" in speaker_link['href']:
-                        #text += self.filter_text(speaker_linkp.text)
+
+            if speaker_link is not None and speaker_link.get('id') is not None:
+                speaker_page = speaker_link.get('href')
+                if speaker_page is not None:
+                    if 'hlasy.sqw' in speaker_page: #or "historie.sqw" in speaker_link['href']:
                         continue
-                if speaker_link.text == "":
+                speaker_link_text = speaker_link.text_content()
+                if speaker_link_text == "":
                     continue
 
                 if r_id != "":
                     interventions[r_id] = Intervention(stenoname=speaker, text=text.strip(), speaker_key=speaker_key)
                 text = ""
-                #if speaker_link.has_attr('id') and 'hlasy.sqw' not in speaker_link['href']:
-                if speaker_link.has_attr('id'):
-                    r_id = speaker_link['id']
-
-                    # some names have a : at the end - remove
-                    speaker_link_text = self.filter_text(speaker_link.text)
-
-                    # old stenos have no href use steno name as key instead
+                r_id = sys.intern(speaker_link.get('id'))
 
-                    if speaker_link_text[-1] == ":":
-                        speaker_link_text = speaker_link_text[:-1]
+                # old stenos have no href use steno name as key instead
+                # the same speaker appears many times, derive the key once
+                cached = self._key_cache.get(speaker_link_text)
+                if cached is None:
+                    cached = self.get_speaker_key(speaker_link_text)
+                    self._key_cache[speaker_link_text] = cached
+                (speaker_link_text, speaker_key) = cached
 
-                    speaker = speaker_link_text.strip().replace(' ', '_')
-                    speaker = speaker.replace(',', '_').replace('__', '_')
+                speaker = speaker_key
+                if speaker_page is None:
+                    speaker_page = ""
 
-                    speaker_key = speaker
-                    try:
-                        speaker_page = speaker_link['href']
-                    except:
-                        speaker_page = ""                  
-
-                    if speaker_key not in self.speakers:
-                        logging.info("New speaker found: %s", speaker_link_text)
-                        self.speakers[speaker_key] = Speaker(speaker_link_text, "", "", "", "", "", "", "", speaker_page)
+                if speaker_key not in self.speakers:
+                    logging.info("New speaker found: %s", speaker_link_text)
+                    self.speakers[speaker_key] = Speaker(speaker_link_text, "", "", "", "", "", "", "", speaker_page)
 
-                speaker_link.extract()
+                # the name of the speaker is not part of the text
+                speaker_link.drop_tree()
+                p_text = p.text_content()
 
-            text += self.filter_text(p.text.strip()) + "\n"
+            text += self.filter_text(p_text.strip()) + "\n"
         if r_id != "":
             interventions[r_id] = Intervention(stenoname=speaker, text=text.strip(), speaker_key=speaker_key)
         return interventions
 
 
+    def get_speaker_key(self, link_text):
+        """Returns the filtered steno name of the speaker and the key for
+        the speakers dictionary, the key is the name with spaces and
+        commas replaced by underscores"""
+
+        steno_name = self.filter_text(link_text)
+
+        # some names have a : at the end - remove
+        if steno_name.endswith(":"):
+            steno_name = steno_name[:-1]
+
+        return (steno_name, sys.intern(_RE_KEYCHARS.sub('_', steno_name.strip())))
+
+
     def parse_speakers(self):
 
-        regex = re.compile("/sqw/detail.sqw\?id=(\d+)$")
+        regex = _RE_SPEAKER_DETAIL
         for key, speaker in self.speakers.items():
 
             name = ""
@@ -433,10 +771,9 @@ class SessionParser:
                 try:
                     text = self.request(speaker.link)
                 except Exception:
-                    logging.error("Failed retrieving info for {}", speaker.stenoname)
+                    logging.error("Failed retrieving info for %s", speaker.stenoname)
                     sys.exit(-1)
-                soup = BeautifulSoup(text, 'html5lib')
-                page_name = self.filter_text(soup.find('h1').text)
+                page_name = self.filter_text(_XPATH_H1_TEXT(lxml.html.fromstring(text)))
             elif "/sqw/detail.sqw" in speaker.link:
                 idx = regex.search(speaker.link)
                 if idx:
@@ -447,32 +784,27 @@ class SessionParser:
                     try:
                         text = self.request(link)
                     except Exception:
-                        logging.error("Failed retrieving info for {}", speaker.values().stenoname)
+                        logging.error("Failed retrieving info for %s", speaker.stenoname)
                         sys.exit(-1)
 
-                    soup = BeautifulSoup(text, 'html5lib')
+                    tree = lxml.html.fromstring(text)
 
-                    page_name = self.filter_text(soup.find('h1').text)
+                    page_name = self.filter_text(_XPATH_H1_TEXT(tree))
 
-                    figcaption =  soup.find_all("div", attrs={"class": "figcaption"})
+                    figcaption = _XPATH_FIGCAPTION(tree)
 
                     if figcaption != []:
-                        text = self.filter_text(figcaption[0].text)
+                        text = self.filter_text(figcaption[0].text_content())
                         if "Zvolen" in text:
-                            figregex = re.compile(r"Narozen.?: ([\d]+)\..(\d+)\..(\d+).*Zvolen.? na kandidátce: (.*)$")
-                            figgs = figregex.search(text)
+                            figgs = _RE_FIG_ZVOLEN.search(text)
                             if figgs:
                                 group = figgs.groups()[3]
                         else:
-                            figregex = re.compile(r"Narozen: ([\d]+)\..(\d+)\..(\d+)$",
-                                              re.DOTALL)
-
-                            figgs = figregex.search(text)
+                            figgs = _RE_FIG_NAROZEN.search(text)
 
                         if figgs:
-                            birth_date = "{0:0>4}{1:0>2}{2:0>2}".format(figgs.groups()[2],
-                                                                        figgs.groups()[1],
-                                                                        figgs.groups()[0])
+                            (day, month, year) = figgs.groups()[:3]
+                            birth_date = f"{year:0>4}{month:0>2}{day:0>2}"
 
             (name, titles, function, sex) = self.get_speakers_name(page_name, speaker.stenoname)
             self.speakers[key] = Speaker(stenoname=speaker.stenoname,
@@ -489,14 +821,9 @@ class SessionParser:
         """Uses the steno name and page name to extract the filtered name
            the function in the parliament and the title"""
 
-        title_strings = ["doc.", "Prof.", "RSDR.", "RSDr.", "RNDr.","Ing.", "JUDr.", "PhDr.", "Mgr.", "MBA", "ThMgr.", "CSc.",
-                             "PaedDr.", "Ph.D.", "MUDr.", "Bc.", "arch.", "Doc.", "MVDr.", "Th"
-                             "prof.", "MVDR.", "MgA.", "PhD.JU", "ThDr.", "PhD.", "DrSc.", "Dr."]
-
-
         titles = ""
         page_name = page_name.replace(',', '').strip()
-        for title in title_strings:
+        for title in TITLE_STRINGS:
             if title in page_name:
                 titles += title + " "
                 page_name = page_name.replace(title, "").strip()
@@ -506,166 +833,85 @@ class SessionParser:
         function = steno_name.replace(page_name, "").strip()
 
 
-        male_strings = ["Poslanec", "Ministr", "Místopředseda", "Předseda", "Senátor","poslanec", "ministr", "místopředseda", "předseda", "senátor"]
-        female_strings = ["Poslankyně",  "Ministryně", "Členka", "Senátorka", "Místopředsedkyně", "poslankyně",  "ministryně", "členka", "senátorka", "místopředsedkyně"]
         sex = ""
-        for female_string in female_strings:
-            if female_string in function:
-                sex = "Woman"
-                break
-        if sex == "":
-            for male_string in male_strings:
-                if male_string in function:
-                    sex = "Man"
-                    break
+        if _RE_FEMALE_FUNCTION.search(function):
+            sex = "Woman"
+        elif _RE_MALE_FUNCTION.search(function):
+            sex = "Man"
 
 
         return (name, titles, function, sex)
 
     def filter_text(self, text):
 
-        if len(text) == 0:
-            return ""
-
-        # remove : at beginning of paragraph
-        if text[0] == ':':
-            text = text[1:].strip()
-
-        # replace '\xa0' with space
-        text = text.replace('\xa0', ' ')
+        # replace all white spaces (and '\xa0') with one space, remove
+        # white spaces from beginning and end and : at beginning of paragraph
+        return _RE_WS.sub(' ', text.translate(_WS_TABLE)).strip().lstrip(':').strip()
 
-        # replace multiple spaces with one, and remove white spaces
-        # from beginning and end
-        text = re.sub( '\s+', ' ', text).strip()
-
-        return text
-
-    def generate_files_and_report(self, output_directory=Path('.'), create_new_report=True):
+    def generate_files_and_report(self, report, output_directory='.'):
         """Iterate the topics dictionary to get all the intrventions per
-        topic, then go to the stenos dictionary to print get intervention"""
-        if not output_directory.exists():
-            output_directory.mkdir(parents=True)
-
-        csv_file = output_directory.joinpath("file_summary.tsv")
+        topic, then go to the stenos dictionary to print get intervention
 
-        if not csv_file.exists():
-            create_new_report = True
-
-        if create_new_report:
-            open_str = 'w+'
-        else:
-            open_str = 'a+'
+        :param report: `csv.writer` for the file summary report, see open_report
+        :param output_directory: `str` directory for the intervention files
+        """
+        os.makedirs(output_directory, exist_ok=True)
 
         count = 0
-        with csv_file.open(open_str) as report_fd:
-            tsv_line = "session\tdate\ttopic_idx\ttopic_str\torder\tname\tsteno_name\tfile_name\n"
-
-            if create_new_report:
-                report_fd.write(tsv_line)
-
-            visited_links = {}
-            for topic_id, topic in self.topics.items():
-                logging.debug(f"{topic_id=} -> {len(topic)=}")
-                for idx, int_info in enumerate(topic):
-                    try:
-                        if int_info.stenopage not in visited_links:
-                            visited_links[int_info.stenopage] = []
-                        else:
-                            if int_info.reftag in visited_links[int_info.stenopage]:
-                                logging.warning(f"GENERATE_FILES: Skipping already visitied {int_info.reftag} in steno {int_info.stenopage}")
-                                continue
-                            else:
-                                visited_links[int_info.stenopage].append(int_info.reftag)
-
-                        steno = self.stenos[int_info.stenopage][int_info.reftag]
-                        # print(f"{steno.stenoname=}")
-                        file_name = self.generate_file_name(int_info.date,
-                                                            topic_id,
-                                                            idx+1,
-                                                            steno.stenoname)
-                        full_file_name = output_directory.joinpath(file_name)
-
-                        with full_file_name.open('w', encoding = 'utf-8') as fd:
-                            fd.write(steno.text)
-
-                            tsv_line = "{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(
-                                self.session_number,
-                                int_info.date,
-                                topic_id,
-                                self.topic_titles[topic_id],
-                                idx+1,
-                                self.speakers[steno.speaker_key].name,
-                                steno.stenoname,
-                                file_name)
-                            report_fd.write(tsv_line)
-
-
-                        count += 1
-                    except KeyError:
-                        logging.error(f"GENERATE_FILES: Can not find key {int_info.reftag} in steno {int_info.stenopage}")
-
-                        #logging.error("Can not find key %s in steno %s",
-                        #              int_info.reftag, int_info.stenopage)
-        logging.info(f"GENERATE FILES: {count} files generated")
-
-
-    def generate_speakers_report(self, output_directory, speakers, create_new_report):
-        if not output_directory.exists():
-            output_directory.mkdir(parents=True)
-
-        csv_file = output_directory.joinpath("speakers_summary.tsv")
-
-        if not csv_file.exists():
-            create_new_report = True
-
-        if create_new_report:
-            open_str = 'w+'
-        else:
-            open_str = 'a+'
-
-        with csv_file.open(open_str) as fd:
-            tsv_line = "name\ttitles\tfunction\tsteno_name\tsex\tparty\tbirthdate\tweb_page\n"
-
-            if create_new_report:
-                fd.write(tsv_line)
-
-            for page, speaker in speakers.items():
-                tsv_line = "{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(
-                    speaker.name,
-                    speaker.titles,
-                    speaker.function,
-                    speaker.stenoname,
-                    speaker.sex,
-                    speaker.group,
-                    speaker.birthdate,
-                    page)
-                fd.write(tsv_line)
+        visited_links = defaultdict(set)
+        for topic_id, topic in self.topics.items():
+            logging.debug("topic_id=%s -> len(topic)=%d", topic_id, len(topic))
+            rows = []
+            for idx, int_info in enumerate(topic):
+                try:
+                    visited_tags = visited_links[int_info.stenopage]
+                    if int_info.reftag in visited_tags:
+                        logging.warning("GENERATE_FILES: Skipping already visitied %s in steno %s",
+                                        int_info.reftag, int_info.stenopage)
+                        continue
+                    visited_tags.add(int_info.reftag)
+
+                    steno = self.stenos[int_info.stenopage][int_info.reftag]
+                    # print(f"{steno.stenoname=}")
+                    file_name = self.generate_file_name(int_info.date,
+                                                        topic_id,
+                                                        idx+1,
+                                                        steno.stenoname)
+                    full_file_name = os.path.join(output_directory, file_name)
+
+                    write_text_file(full_file_name, steno.text)
+
+                    rows.append(tsv_row((self.session_number,
+                                         int_info.date,
+                                         topic_id,
+                                         self.topic_titles[topic_id],
+                                         idx+1,
+                                         self.speakers[steno.speaker_key].name,
+                                         steno.stenoname,
+                                         file_name)))
+
+                    count += 1
+                except KeyError:
+                    logging.error("GENERATE_FILES: Can not find key %s in steno %s",
+                                  int_info.reftag, int_info.stenopage)
+            report.writerows(rows)
+        logging.info("GENERATE FILES: %d files generated", count)
 
 
     def generate_file_name(self, date_string, topic_id, order, name):
         """Generate the file name string
         :param data_string str: a string containing the date
-        :param topic_id str: a string containing the topic id
+        :param topic_id int: a number indicating the topic id
         :param order int: a number indicating the intervention ordor for the topic
         :param name str: a string containing the speaker name
         :rtype: a string containing the file name
         """
-        file_name = 's_{0:0>3}_{1}_t_{2:0>3}_i_{3:0>3}_{4}.txt'.format(self.session_number,
-                                                                 date_string,
-                                                                 topic_id,
-                                                                 order,
-                                                                 name)
-        return file_name
+        return f's_{self.session_number:03d}_{date_string}_t_{topic_id:03d}_i_{order:03d}_{name}.txt'
 
 
     def parse_sublink_order(self, order_id, sublink):
 
-        if self.year >= 2010:
-            reg_ex_page = re.compile('^(.*.html).*')
-        else:
-            reg_ex_page = re.compile('^.*schuz/(.*.html).*')
-
-        page_name = reg_ex_page.match(sublink)
+        page_name = self._page_re.match(sublink)
 
         if None == page_name:
             logging.error("Can not find page name in sublink %s", sublink)
@@ -690,42 +936,42 @@ class SessionParser:
             page = self.Page()
             page.link = link
             page.content = text
-            page.soup = BeautifulSoup(text, 'html5lib')
-            (rc, date) = self.get_steno_date(page.soup)
+            page.tree = lxml.html.fromstring(text)
+            (rc, date) = self.get_steno_date(page.tree)
             if False == rc:
                 logging.error("Can not find date in steno %s", link)
                 return False
             page.date_string = date
-            self.parse_interventions_page(page.soup, date)
+            self.parse_interventions_page(page.tree, date)
             self.pages[page_idx] = page
 
         return True
 
-    def parse_interventions_page(self, page_soup, date):
-        """Get a list of all the q tags and all the a links below"""
-        a_links = page_soup.find_all('a')
-
-        intervention_link = re.compile('(s[\d]*.htm)#(r[\d]*)$')
+    def parse_interventions_page(self, page_tree, date):
+        """Get a list of all the q tags and all the a links below
 
+        :param page_tree: `lxml.html.HtmlElement` root of the page
+        """
         q_id = ""
-        for link in a_links:
-            # print(f"{link}")
-            if link.has_attr('name'):
-                q_id = link['name']
+        for link in _XPATH_PAGE_LINKS(page_tree):
+            name = link.get('name')
+            if name is not None:
+                q_id = name
                 if q_id not in self.interventions_info:
-                    self.interventions_info[q_id] = []
-            elif link.has_attr('href') and q_id != "":
-                info = intervention_link.search(link['href'])
+                    # a dict keeps the order and has O(1) membership
+                    self.interventions_info[q_id] = {}
+            elif q_id != "":
+                info = _RE_INTERVENTION_LINK.search(link.get('href'))
 
                 if None != info:
-                    steno_name = self.filter_text(link.text)
+                    steno_name = self.filter_text(link.text_content())
+                    # pages and tags are used as keys many times, intern them
                     new_intervention_info = InterventionInfo(pageref=info.group(0),
-                                                             stenopage=info.group(1),
-                                                             reftag=info.group(2),
+                                                             stenopage=sys.intern(info.group(1)),
+                                                             reftag=sys.intern(info.group(2)),
                                                              steno_name=steno_name,
                                                              date=date)
-                    if new_intervention_info not in self.interventions_info[q_id]:
-                        self.interventions_info[q_id].append(new_intervention_info)
+                    self.interventions_info[q_id].setdefault(new_intervention_info, None)
 
 
     def get_qid_for_topic(self, link):
@@ -735,8 +981,7 @@ class SessionParser:
         for all the links get the page if not allready in
         stenos and extract the text for a given person
         """
-        reg_ex_topic = re.compile('^.*html#(q[\d]+)$')
-        topic  = reg_ex_topic.match(link)
+        topic  = _RE_TOPIC_QID.match(link)
         if None == topic:
             logging.warning("Could not find 'q' topic separator in %s", link)
             return None
@@ -750,54 +995,114 @@ class SessionParser:
         for all the links get the page if not allready in
         stenos and extract the text for a given person
         """
-        if year == 2013:
-            reg_ex_topic = re.compile('^.*html(#[a-z][\d]+)$')
-        else:
-            reg_ex_topic = re.compile('^.*html#([\d]+)$')
-        topic  = reg_ex_topic.match(link)
+        topic  = self._topic_hash_re.match(link)
         if None == topic:
             logging.warning("Could not find '#' topic separator in %s", link)
             return None
 
         return topic.group(1)
 
-    def get_steno_date(self, soup):
+    def get_steno_date(self, page_tree):
         """Find metadata of the stenotype on the title.
         Returns a set containin valid if the title is valid,
         index of the session, and date in yyyymmdd format"""
 
 
-        title = soup.find('title').string
+        title = page_tree.findtext('.//title')
 
-        if len(title) == 0:
+        if not title:
             return (False, "")
 
         title = title.replace('\xa0', ' ')
 
-        reg_ex_title_date = re.compile(r'Stenografický zápis [\d]+. schůze, ([\d]+).\s(.*)\s(\d{4})')
-        d = reg_ex_title_date.search(title)
+        d = _RE_TITLE_DATE.search(title)
         if d == None:
             logging.error("Can not find date in title: %s", title)
             return (False, "")
 
-        date = "{0}{1:0>2}{2:0>2}".format(d.group(3), CzechMonths[d.group(2)], int(d.group(1)))
+        date = f"{d.group(3)}{CzechMonths[d.group(2)]:02d}{int(d.group(1)):02d}"
         return (True, date)
 
+NAME_STOP_WORDS = ["PhDr.", "Ing.", "prof.", "JUDr." "RSDr.", "Mgr.",
+                   "arch.", "RNDr.", "MVDR.", "MgA.", "MUDr.", "ThDr.",
+                   "MBA", "doc." "CSc.", "PaedDr.", "Bc.", "PhD.", "DrSc.",
+                   "Ph.D."]
+# (word, lowercase word, length) computed once for the case insensitive search
+_NAME_STOP_WORDS_LOWER = [(word, word.lower(), len(word)) for word in NAME_STOP_WORDS]
+# punctuation deleted from the names
+_NAME_STRIP = str.maketrans('', '', ',;')
+
+
 def filter_names_and_titles(name):
-    stop_words = ["PhDr.", "Ing.", "prof.", "JUDr." "RSDr.", "Mgr.",
-                  "arch.", "RNDr.", "MVDR.", "MgA.", "MUDr.", "ThDr.",
-                  "MBA", "doc." "CSc.", "PaedDr.", "Bc.", "PhD.", "DrSc.",
-                  "Ph.D."]
-    titles = ""
-    for word in stop_words:
-        pos = name.lower().find(word.lower())
+    titles = []
+    name_lower = name.lower()
+    for word, word_lower, word_len in _NAME_STOP_WORDS_LOWER:
+        # words longer than what is left of the name can not be found,
+        # this also skips the rest of the words once the name is empty
+        if word_len > len(name_lower):
+            continue
+        pos = name_lower.find(word_lower)
         if pos != -1:
-            titles += word + " "
-            name = name[:pos] + name[pos + len(word):]
+            titles.append(word)
+            name = name[:pos] + name[pos + word_len:]
+            name_lower = name_lower[:pos] + name_lower[pos + word_len:]
+
+    name = name.translate(_NAME_STRIP)
+
+    return (name.strip(), " ".join(titles))
+
 
-    name = name.replace(',', '')
+def process_session(year, base_page_url, session_number, link):
+    """Downloads and parses a session, sessions are independent so this runs
+    in a worker thread. The speakers are shared by all the sessions and are
+    resolved later by the main thread.
 
-    return (name.strip(), titles.strip())
+    :rtype: `SessionParser` with the parsed session"""
+    session = SessionParser(year, base_page_url, session_number, link, HTTP)
+    session.parse_session()
+    # the session waits for the previous ones to be written, do not keep
+    # the parsed pages alive until then
+    session.release_pages()
+    return session
+
+
+def iter_sessions(executor, year, base_page_url, session_jobs, window):
+    """Yields the parsed sessions in the order of session_jobs, only window
+    sessions are submitted ahead of the one being consumed so the finished
+    sessions do not pile up in memory
+
+    :param executor: `ThreadPoolExecutor` running process_session
+    :param session_jobs: `list` of (session number, link) tuples
+    :param window: `int` number of sessions submitted in advance
+    """
+    jobs = iter(session_jobs)
+    pending = deque(executor.submit(process_session, year, base_page_url, *job)
+                    for job in islice(jobs, window))
+    while pending:
+        session = pending.popleft().result()
+        # keep the workers busy while the caller handles this session
+        for job in islice(jobs, 1):
+            pending.append(executor.submit(process_session, year, base_page_url, *job))
+        yield session
+
+
+def generate_speakers_report(output_directory, speakers, create_new_report):
+    """Writes the speakers of all the sessions to the speakers summary report
+
+    :param output_directory: `str` directory for the report
+    :param speakers: `dict` of `Speaker` by speaker key
+    :param create_new_report: `bool` overwrite the report if it already exists
+    """
+    with open_report(output_directory, "speakers_summary.tsv",
+                     SPEAKERS_SUMMARY_HEADER, create_new_report) as report:
+        report.writerows(tsv_row((speaker.name,
+                                  speaker.titles,
+                                  speaker.function,
+                                  speaker.stenoname,
+                                  speaker.sex,
+                                  speaker.group,
+                                  speaker.birthdate,
+                                  page)) for page, speaker in speakers.items())
 
 
 def parse_args():
@@ -805,8 +1110,6 @@ def parse_args():
     :rtype: argparser.args object
     """
 
-    valid_years = ["1993", "1996", "1998", "2002", "2006", "2010", "2013", "2017"]
-
     parser = argparse.ArgumentParser(description='Download steno-protocols in psp.cz')
     parser.add_argument('--index', action='store_true', default=False,
                         dest='generate_index',
@@ -816,18 +1119,25 @@ def parse_args():
                         help='output directory')
     parser.add_argument('-y', '--year', action='store', default='2017',
                         dest='year',
-                        help=f'session year {valid_years}')
+                        help=f'session year {sorted(VALID_YEARS)}')
     parser.add_argument('-n', '--new-report', action='store_true', default=False,
                         dest='create_new_report',
                         help='creates a new report for data dowdloaded if already '
                             + 'exists, otherwise creates a new one')
+    parser.add_argument('-j', '--jobs', action='store', type=int, default=SESSION_WORKERS,
+                        dest='jobs',
+                        help=f'number of sessions processed in parallel, default {SESSION_WORKERS}')
 
     args = parser.parse_args()
 
 
-    if args.year not in valid_years:
-        print(f"Invalid session year, valid years are {valid_years}")
-        logging.error("(): Invalid session year".format(args.year))
+    if args.jobs < 1:
+        print("The number of jobs must be at least 1")
+        sys.exit(-1)
+
+    if args.year not in VALID_YEARS:
+        print(f"Invalid session year, valid years are {sorted(VALID_YEARS)}")
+        logging.error("Invalid session year: %s", args.year)
         sys.exit(-1)
 
     return args
@@ -837,7 +1147,19 @@ if __name__ == "__main__":
 
     #FORMAT = "[%(filename)s:%(lineno)s - %(funcName)20s() ] %(message)s"
     FORMAT = "[%(lineno)s - %(funcName)20s() ] %(message)s"
-    logging.basicConfig(format=FORMAT, filename='download_stenos.log', level=logging.INFO)
+    # the log records are buffered and written in batches, errors flush the
+    # buffer right away and logging.shutdown() flushes the rest at exit
+    log_handler = logging.FileHandler('download_stenos.log')
+    log_handler.setFormatter(logging.Formatter(FORMAT))
+    logger = logging.getLogger()
+    logger.addHandler(logging.handlers.MemoryHandler(capacity=1024,
+                                                     flushLevel=logging.ERROR,
+                                                     target=log_handler))
+    logger.setLevel(logging.INFO)
+
+    # the progress lines are block buffered even on a terminal, the buffer
+    # is flushed once per completed session
+    sys.stdout.reconfigure(line_buffering=False, write_through=False)
 
     args = parse_args()
     year = int(args.year) # 1993, 1996, 1998, 2002, 2006, 2010, 2013 or 2017
@@ -850,55 +1172,74 @@ if __name__ == "__main__":
     steno_page_url = base_page_url + 'index.htm'
 
 
-    res = requests.get(steno_page_url)
+    try:
+        res = HTTP.get(steno_page_url, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        res = None
 
-    if check_request(res) == False:
-        logging.error("Can not connect to page: {}".format(steno_page_url))
+    if res is None or not res.ok:
+        logging.error("Can not connect to page: %s", steno_page_url)
         exit(-1)
+    logging.info("Connected to page %s", steno_page_url)
 
     # get the links for all session pages
     #
-    session_links = get_all_stenos(res.text, year)
+    session_links = get_all_stenos(res.content, year)
+    # drop repeated links keeping the order, each one costs a download
+    links_found = len(session_links)
+    session_links = list(dict.fromkeys(session_links))
+    logging.info("Session links: %d found, %d unique", links_found, len(session_links))
 
     #base = set([link[:9]+"index.htm" for link in session_links])
 
     #session_links = list(base) + session_links
 
-    #m = re.compile('^([\d]+)schuz/.+\.htm[l]?$')
-    m = re.compile('^([\d]+)schuz/index.htm$')
-    create_new_report = args.create_new_report
     request_counter = 0
     print(f"{len(session_links)=}")
-    session = None
-    speakers = {}
+    # normalize the links once, only <number>schuz/index.htm are sessions
+    suffix = '' if year >= 2010 else 'index.htm'
+    session_jobs = []
     for idx, link in enumerate(session_links):
-
-        if year < 2010:
-            link += 'index.htm'
-        session_id = m.match(link)
+        link += suffix
         print(f'id:{idx} - link: {link}')
-        if session_id == None:
+        session_number, sep, rest = link.partition('schuz/')
+        if sep and rest == 'index.htm' and session_number.isascii() and session_number.isdigit():
+            session_jobs.append((session_number, link))
+        else:
             logging.debug("Can not get session number from link %s", link)
-            continue
-
-        session = SessionParser(year, base_page_url, session_id.group(1), link)
-        session.speakers = speakers
-
-        session.parse_session()
-        session.parse_speakers()
 
-        speakers = {**speakers, **session.speakers}  # requires python >=3.5
-        #session.generate_files(Path(args.output_directory))
-        #session.generate_report(Path(args.output_directory), create_new_report)
-        output_directory = Path(args.output_directory)
-        session.generate_files_and_report(output_directory, create_new_report)
-
-        request_counter += session.request_counter
-        print("Completed session {}: accesses {} / cum. {}\n".format(session_id.group(1),
-                                                                     session.request_counter,
-                                                                     request_counter))
-
-        create_new_report = False
-
-    session.generate_speakers_report(Path(args.output_directory),
-                                     speakers, True)
+    speakers = {}
+    # the paths of the files are joined as strings, the directory is the
+    # same for all the sessions
+    output_directory = os.fspath(args.output_directory)
+    # sessions are downloaded and parsed in parallel, the results are
+    # written in order by this thread so the reports do not depend on
+    # which session finishes first
+    # the file summary report is shared by all the sessions
+    # on errors the queued sessions are cancelled instead of waiting for them
+    executor = ThreadPoolExecutor(max_workers=args.jobs)
+    try:
+        with open_report(output_directory, "file_summary.tsv",
+                         FILE_SUMMARY_HEADER, args.create_new_report) as file_summary:
+            for session in iter_sessions(executor, year, base_page_url,
+                                         session_jobs, args.jobs):
+
+                # each speaker page is retrieved and parsed only once, the
+                # session resolves the speakers not seen in previous sessions
+                for key, speaker in session.speakers.items():
+                    speakers.setdefault(key, speaker)
+                session.speakers = speakers
+                session.parse_speakers()
+                session.generate_files_and_report(file_summary, output_directory)
+
+                request_counter += session.request_counter
+                print("Completed session {}: accesses {} / cum. {}\n".format(session.session_number,
+                                                                             session.request_counter,
+                                                                             request_counter))
+                sys.stdout.flush()
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    generate_speakers_report(output_directory, speakers, True)